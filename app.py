@@ -10,17 +10,30 @@
 
 from __future__ import annotations
 
-import json
-from datetime import date, datetime
+import copy
+import random
+import time
+from datetime import date, datetime, timezone
+from secrets import token_hex
 from typing import Literal, Optional
 
 import streamlit as st
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import (BaseModel, Field, PrivateAttr, SerializationInfo, TypeAdapter, ValidationError,
+                      field_serializer, field_validator, model_validator)
 from streamlit_sortables import sort_items
-from streamlit_elements import elements, mui
+
+try:
+    from httpx import TransportError as _SbTransportError  # zależność supabase
+except ImportError:  # bez supabase (i httpx) działa tylko tryb session_state – _sb_execute nie jest wołane
+    _SbTransportError = OSError
 
 BUILD_TAG = "v5.4.2-projects-inline-modal"
 REV_KEY = "_view_rev"
+BOARD_REV_KEY = "_board_rev"
+PROJECTS_TTL = 30  # s – jak długo lista projektów z DB (id, data, updated_at) jest aktualna w sesji
+DND_PAGE = 200  # max. kart na kolumnę w komponencie DnD (reszta po „Pokaż wszystkie”)
+DB_RETRIES = 3       # próby zapytania do Supabase przy błędach sieci
+DB_RETRY_BASE = 0.2  # s – opóźnienie bazowe, podwajane co próbę (+ losowy jitter)
 
 # ───────────────────────── Polyfill modala (INLINE) ───────────────────────── #
 def _modal(title: str, key: str | None = None):
@@ -36,20 +49,7 @@ def _modal(title: str, key: str | None = None):
 
     class _InlinePanel:
         def __enter__(self):
-            st.markdown(
-                """
-                <div style="
-                    margin: 12px auto 8px auto;
-                    max-width: 760px;
-                    padding: 16px 16px 2px 16px;
-                    border-radius: 12px;
-                    background: rgba(28,28,30,.95);
-                    border: 1px solid rgba(255,255,255,.08);
-                    box-shadow: 0 10px 30px rgba(0,0,0,.35);
-                ">
-                """,
-                unsafe_allow_html=True,
-            )
+            st.markdown('<div class="kpanel">', unsafe_allow_html=True)  # styl w globalnym <style>
             st.markdown(f"#### {title}")
             return st.container()
         def __exit__(self, exc_type, exc, tb):
@@ -57,21 +57,42 @@ def _modal(title: str, key: str | None = None):
             return False
     return _InlinePanel()
 
+# ───────────────────────── Polyfill fragmentu ───────────────────────── #
+def _fragment(fn):
+    """st.fragment (1.37+) / st.experimental_fragment (1.33–1.36); bez nich – zwykła funkcja."""
+    deco = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return deco(fn) if deco else fn
+
 # ───────────────────────── Supabase helpers ───────────────────────── #
 def _sb_table_name() -> str:
     return st.secrets.get("SUPABASE_TABLE", "boards")
 
+@st.cache_resource(show_spinner=False)
+def _sb_connect(url: str, key: str):
+    # jeden klient (i jego pula HTTP) na proces; wyjątki nie są cache'owane
+    from supabase import create_client
+    return create_client(url, key)
+
+def _sb_execute(query):
+    """query.execute() z ponowieniem przy zerwanym połączeniu/timeoucie; błędy HTTP (4xx/5xx z API) bez ponowień."""
+    for attempt in range(DB_RETRIES):
+        try:
+            return query.execute()
+        except _SbTransportError:
+            if attempt == DB_RETRIES - 1:
+                _sb_connect.clear()  # kolejne wywołanie zbuduje klienta (i pulę połączeń) od nowa
+                raise
+            time.sleep(DB_RETRY_BASE * 2 ** attempt + random.uniform(0, DB_RETRY_BASE))
+
 def _sb_client():
-    try:
-        from supabase import create_client
-    except Exception:
-        return None
     url = st.secrets.get("SUPABASE_URL")
     key = st.secrets.get("SUPABASE_KEY")
     if not url or not key:
         return None
     try:
-        return create_client(url, key)
+        return _sb_connect(url, key)
+    except ImportError:
+        return None
     except Exception as e:
         st.error(f"Nie udało się połączyć z Supabase: {e}")
         return None
@@ -96,6 +117,13 @@ class Task(BaseModel):
             return date.fromisoformat(v)
         return v
 
+    @field_serializer("due", when_used="json")
+    def dump_due(self, v: Optional[date], info: SerializationInfo) -> Optional[str]:
+        # tylko eksport (context={"export": True}): brak terminu = "" (parse_due przyjmuje to z powrotem);
+        # zapis do DB zostaje przy null
+        if v: return v.isoformat()
+        return "" if (info.context or {}).get("export") else None
+
 class ColumnModel(BaseModel):
     id: str
     name: str
@@ -104,34 +132,68 @@ class ColumnModel(BaseModel):
 class Board(BaseModel):
     columns: list[ColumnModel]
     tasks: dict[str, Task]
+    _col_idx: Optional[dict[str, int]] = PrivateAttr(default=None)
+    _task_col: Optional[dict[str, str]] = PrivateAttr(default=None)
+
+    def col_index(self) -> dict[str, int]:
+        """id kolumny → pozycja w columns; liczone leniwie, kasowane przez invalidate_index()."""
+        if self._col_idx is None:
+            self._col_idx = {c.id: i for i, c in enumerate(self.columns)}
+        return self._col_idx
+
+    def column(self, column_id: str) -> Optional[ColumnModel]:
+        i = self.col_index().get(column_id)
+        return None if i is None else self.columns[i]
+
+    def column_of(self, task_id: str) -> Optional[ColumnModel]:
+        """Kolumna zawierająca zadanie (odwrotny indeks tid → id kolumny)."""
+        if self._task_col is None:
+            self._task_col = {tid: c.id for c in self.columns for tid in c.task_ids}
+        cid = self._task_col.get(task_id)
+        return None if cid is None else self.column(cid)
+
+    def invalidate_index(self):
+        self._col_idx = None
+        self._task_col = None
 
     @model_validator(mode="after")
     def check_references(self):
-        task_keys = set(self.tasks.keys())
-        seen = set()
+        seen, assigned = set(), set()
         for col in self.columns:
             if col.id in seen:
                 raise ValueError(f"Duplicate column id '{col.id}'.")
             seen.add(col.id)
             for tid in col.task_ids:
-                if tid not in task_keys:
+                if tid not in self.tasks:
                     raise ValueError(f"Task id '{tid}' w kolumnie '{col.name}' nie istnieje.")
-        assigned = {tid for c in self.columns for tid in c.task_ids}
-        orphans = set(self.tasks.keys()) - assigned
+                if tid in assigned:  # karta w dwóch miejscach rozjechałaby wynik DnD z wysłanymi kartami
+                    raise ValueError(f"Task id '{tid}' występuje na tablicy więcej niż raz (kolumna '{col.name}').")
+                assigned.add(tid)
+        orphans = self.tasks.keys() - assigned
         if orphans and self.columns:
-            self.columns[0].task_ids.extend(sorted(list(orphans)))
+            self.columns[0].task_ids.extend(sorted(orphans))
         return self
 
-DEFAULT_BOARD = Board(
-    columns=[
-        ColumnModel(id="todo",   name="Do zrobienia", task_ids=[]),
-        ColumnModel(id="inprog", name="W trakcie",   task_ids=[]),
-        ColumnModel(id="done",   name="Zrobione",    task_ids=[]),
+# jeden walidator na cały skrypt zamiast budowania stanu walidacji przy każdym wywołaniu
+_BOARD_ADAPTER = TypeAdapter(Board)
+
+# domyślna tablica jako gotowy zrzut JSON – bez budowania modeli przy starcie
+DEFAULT_BOARD_DICT = {
+    "columns": [
+        {"id": "todo",   "name": "Do zrobienia", "task_ids": []},
+        {"id": "inprog", "name": "W trakcie",    "task_ids": []},
+        {"id": "done",   "name": "Zrobione",     "task_ids": []},
     ],
-    tasks={},
-)
+    "tasks": {},
+}
+
+def default_board_dict() -> dict:
+    return copy.deepcopy(DEFAULT_BOARD_DICT)
 
 # ───────────────────────── Projekty: stan + DB ───────────────────────── #
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)  # datetime.utcnow() jest przestarzałe (3.12+)
+
 def _default_project_id() -> str:
     return st.session_state.get("project_id") or "main"
 
@@ -143,12 +205,48 @@ def _ss_projects_store() -> dict:
         st.session_state["projects_store"] = {}
     return st.session_state["projects_store"]
 
+def _sb_rows(sb) -> dict[str, dict]:
+    """Lista projektów (id, updated_at) jednym SELECT-em, bez data – wystarcza na listę i status."""
+    cache = st.session_state.get("_projects_cache")
+    if cache is None or time.monotonic() - cache[0] > PROJECTS_TTL:
+        resp = _sb_execute(sb.table(_sb_table_name()).select("id,updated_at"))
+        cache = (time.monotonic(), {r["id"]: r for r in (resp.data or [])})
+        st.session_state["_projects_cache"] = cache
+    return cache[1]
+
+def _sb_rows_invalidate():
+    st.session_state.pop("_projects_cache", None)
+
+def _sb_rows_put(pid: str, updated_at: str):
+    cache = st.session_state.get("_projects_cache")
+    if cache is not None:
+        cache[1][pid] = {"id": pid, "updated_at": updated_at}
+
+def _sb_fetch_row(sb, pid: str) -> Optional[dict]:
+    """Aktualny wiersz projektu (z data) prosto z DB – tablica wczytana z cache listy mogłaby mieć
+    do PROJECTS_TTL, a pierwszy zapis (upsert całego wiersza) nadpisałby zmiany innych sesji."""
+    resp = _sb_execute(sb.table(_sb_table_name()).select("id,data,updated_at").eq("id", pid).limit(1))
+    row = resp.data[0] if resp.data else None
+    if row is not None:
+        _sb_rows_put(pid, row["updated_at"])
+    return row
+
+def _sb_insert_if_absent(sb, pid: str, data: dict) -> dict:
+    """Wstawia tablicę tylko, gdy wiersza jeszcze nie ma (ON CONFLICT DO NOTHING) i zwraca dane z DB.
+    Zwykły upsert nadpisałby projekt, który inna sesja utworzyła po naszym (cache'owanym) SELECT-cie."""
+    payload = {"id": pid, "data": data, "updated_at": _utcnow().isoformat()}
+    resp = _sb_execute(sb.table(_sb_table_name()).upsert(payload, on_conflict="id", ignore_duplicates=True))
+    if not resp.data:  # wiersz już istniał – pobierz jego aktualną wersję
+        return (_sb_fetch_row(sb, pid) or payload)["data"]
+    _sb_rows_put(pid, payload["updated_at"])
+    return payload["data"]
+
 def db_project_exists(pid: str) -> bool:
     sb = _sb_client()
     if not sb:
         return pid in _ss_projects_store()
     try:
-        resp = sb.table(_sb_table_name()).select("id").eq("id", pid).limit(1).execute()
+        resp = _sb_execute(sb.table(_sb_table_name()).select("id").eq("id", pid).limit(1))
         return bool(resp.data)
     except Exception:
         return False
@@ -158,15 +256,12 @@ def db_list_projects() -> list[str]:
     if not sb:
         store = _ss_projects_store()
         if not store:
-            store["main"] = DEFAULT_BOARD.model_dump(mode="json")
+            store["main"] = default_board_dict()
         return sorted(store.keys(), key=str.lower)
     try:
-        resp = sb.table(_sb_table_name()).select("id").order("id", desc=False).execute()
-        ids = [r["id"] for r in (resp.data or [])]
+        ids = sorted(_sb_rows(sb))
         if not ids:
-            sb.table(_sb_table_name()).upsert(
-                {"id": "main", "data": DEFAULT_BOARD.model_dump(mode="json"), "updated_at": datetime.utcnow().isoformat()}
-            ).execute()
+            _sb_insert_if_absent(sb, "main", default_board_dict())
             return ["main"]
         return ids
     except Exception as e:
@@ -181,19 +276,16 @@ def db_load_board_default_insert(pid: str, default_payload: dict) -> dict | None
             store[pid] = default_payload
         return store[pid]
     try:
-        resp = sb.table(_sb_table_name()).select("data").eq("id", pid).limit(1).execute()
-        rows = resp.data or []
-        if not rows:
-            sb.table(_sb_table_name()).upsert(
-                {"id": pid, "data": default_payload, "updated_at": datetime.utcnow().isoformat()}
-            ).execute()
-            return default_payload
-        return rows[0]["data"]
+        row = _sb_fetch_row(sb, pid)
+        if row is None:
+            return _sb_insert_if_absent(sb, pid, default_payload)
+        return row["data"]
     except Exception as e:
         st.error(f"DB load error: {e}")
         return None
 
-def db_load_board_raw(pid: str):
+def db_load_board_raw(pid: str, with_data: bool = True):
+    """(wiersz, status); with_data=False – tylko id/updated_at z cache listy (status w sidebarze)."""
     sb = _sb_client()
     if not sb:
         store = _ss_projects_store()
@@ -202,45 +294,48 @@ def db_load_board_raw(pid: str):
             return None, "not_found"
         return {"id": pid, "data": data, "updated_at": "session"}, "ok"
     try:
-        resp = sb.table(_sb_table_name()).select("*").eq("id", pid).limit(1).execute()
-        rows = resp.data or []
-        if not rows:
+        row = _sb_fetch_row(sb, pid) if with_data else _sb_rows(sb).get(pid)
+        if row is None:
             return None, "not_found"
-        return rows[0], "ok"
+        return row, "ok"
     except Exception as e:
         return {"error": str(e)}, "error"
 
-def db_save_board(pid: str, board_dict: dict) -> None:
+def db_save_board(pid: str, board_dict: dict) -> bool:
     sb = _sb_client()
     if not sb:
         _ss_projects_store()[pid] = board_dict
-        st.session_state["_last_db_save"] = datetime.utcnow().strftime("%H:%M:%S")
-        return
+        return True
     try:
-        payload = {"id": pid, "data": board_dict, "updated_at": datetime.utcnow().isoformat()}
-        sb.table(_sb_table_name()).upsert(payload).execute()
-        st.session_state["_last_db_save"] = datetime.utcnow().strftime("%H:%M:%S")
+        # czas zapisu widać w statusie jako updated_at (z cache wierszy) – bez osobnego pola w sesji
+        payload = {"id": pid, "data": board_dict, "updated_at": _utcnow().isoformat()}
+        _sb_execute(sb.table(_sb_table_name()).upsert(payload))
+        _sb_rows_put(pid, payload["updated_at"])
+        return True
     except Exception as e:
         st.error(f"DB save error: {e}")
+        return False
 
 def db_delete_project(pid: str) -> None:
+    if (st.session_state.get("_last_saved") or (None,))[0] == pid:
+        st.session_state.pop("_last_saved")  # ponownie utworzony projekt o tej nazwie musi się zapisać
     sb = _sb_client()
     if not sb:
         _ss_projects_store().pop(pid, None)
         return
     try:
-        sb.table(_sb_table_name()).delete().eq("id", pid).execute()
+        _sb_execute(sb.table(_sb_table_name()).delete().eq("id", pid))
+        cache = st.session_state.get("_projects_cache")
+        if cache is not None:
+            cache[1].pop(pid, None)
     except Exception as e:
         st.error(f"DB delete project error: {e}")
 
 def db_clone_project(old_id: str, new_id: str) -> bool:
-    data = db_load_board_default_insert(old_id, DEFAULT_BOARD.model_dump(mode="json"))
-    if data is None:
-        return False
-    if db_project_exists(new_id):
-        st.error("Projekt o takiej nazwie już istnieje.")
+    """Przenosi dane old_id → new_id; istnienie new_id sprawdza wołający (_do_rename_project)."""
+    row, status = db_load_board_raw(old_id)  # odczyt bez wstawiania domyślnej tablicy
+    if status != "ok" or not db_save_board(new_id, row["data"]):
         return False
-    db_save_board(new_id, data)
     db_delete_project(old_id)
     return True
 
@@ -252,25 +347,87 @@ def current_project() -> str:
         _set_project_id(pid)
     return pid
 
+def _board_from_dict(d: dict) -> Board:
+    """Zaufany zrzut (nasz save_board / DB) → Board przez model_construct, bez walidacji."""
+    tasks = {}
+    for tid, v in d["tasks"].items():
+        due = v.get("due")
+        if isinstance(due, str):
+            due = date.fromisoformat(due) if due else None
+        tasks[tid] = Task.model_construct(**{**v, "due": due, "tags": list(v.get("tags", ()))})
+    columns = [ColumnModel.model_construct(id=c["id"], name=c["name"], task_ids=list(c.get("task_ids", ())))
+               for c in d["columns"]]
+    return Board.model_construct(columns=columns, tasks=tasks)
+
 def get_board() -> Board:
     pid = current_project()
     if "board" not in st.session_state or st.session_state.get("_board_pid") != pid:
-        data = db_load_board_default_insert(pid, DEFAULT_BOARD.model_dump(mode="json"))
-        st.session_state.board = data if data else DEFAULT_BOARD.model_dump(mode="json")
+        data = db_load_board_default_insert(pid, default_board_dict())
+        st.session_state.board = data if data else default_board_dict()
         st.session_state["_board_pid"] = pid
-    return Board(**st.session_state.board)
+    board = st.session_state.board
+    if isinstance(board, dict):
+        # dict z DB / starszej sesji → budujemy raz, dalej trzymamy żywy obiekt
+        # (isinstance(…, Board) nie zadziała – klasa powstaje od nowa przy każdym rerunie)
+        board = _board_from_dict(board)
+        st.session_state.board = board
+        bump_board_rev()
+        # _last_saved to nasz ostatni zapis, nie stan DB – po wczytaniu (np. Force DB reload, cudza zmiana)
+        # powrót do tego samego payloadu musi się zapisać
+        st.session_state.pop("_last_saved", None)
+    return board
+
+def board_payload(board: Board) -> dict:
+    """Zrzut JSON do DB; zadania bez zmian (ten sam obiekt Task) biorą gotowy zrzut z cache."""
+    old_dumps, dumps = st.session_state.get("_task_dump_cache", {}), {}
+    for tid, t in board.tasks.items():
+        hit = old_dumps.get(tid)
+        if hit is None or hit[0] is not t:
+            hit = (t, t.model_dump(mode="json"))
+        dumps[tid] = hit
+    st.session_state["_task_dump_cache"] = dumps
+    return {"columns": [c.model_dump() for c in board.columns],
+            "tasks": {tid: d for tid, (_, d) in dumps.items()}}
 
 def save_board(board: Board):
     pid = current_project()
-    as_dict = board.model_dump(mode="json")
-    st.session_state.board = as_dict
+    st.session_state.board = board
     st.session_state["_board_pid"] = pid
-    db_save_board(pid, as_dict)
+    board.invalidate_index()  # każda mutacja przechodzi tędy
+    bump_board_rev()
+    st.session_state["_board_dirty"] = pid  # zapis do DB raz na przebieg – flush_board()
+
+def flush_board():
+    """Jeden upsert zamiast jednego na każdą mutację; wołane na początku i na końcu skryptu."""
+    pid = st.session_state.pop("_board_dirty", None)
+    board = st.session_state.get("board")
+    if pid is None or board is None or st.session_state.get("_board_pid") != pid:
+        return
+    payload = board_payload(board)
+    if st.session_state.get("_last_saved") == (pid, payload):
+        return  # np. „Zapisz” bez zmian – niezmienione zadania to te same obiekty, więc == jest tanie
+    if db_save_board(pid, payload):
+        st.session_state["_last_saved"] = (pid, payload)
+    else:
+        st.session_state["_board_dirty"] = pid  # ponowna próba w następnym przebiegu
 
 def bump_rev():
     st.session_state[REV_KEY] = st.session_state.get(REV_KEY, 0) + 1
 
+def bump_board_rev():
+    st.session_state[BOARD_REV_KEY] = st.session_state.get(BOARD_REV_KEY, 0) + 1
+
+def _session_memo(name: str, key, build):
+    """Wynik build() trzymany w session_state, liczony ponownie tylko gdy zmieni się key."""
+    hit = st.session_state.get(name)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    value = build()
+    st.session_state[name] = (key, value)
+    return value
+
 def switch_project(pid: str):
+    flush_board()
     _set_project_id(pid)
     st.session_state.pop("board", None)
     st.session_state["_board_pid"] = pid
@@ -279,17 +436,14 @@ def switch_project(pid: str):
 
 # ───────────────────────── Operacje na zadaniach/kolumnach ───────────────────────── #
 def next_id(prefix: str) -> str:
-    import uuid as _uuid
-    return f"{prefix}-{_uuid.uuid4().hex[:8]}"
+    return f"{prefix}-{token_hex(4)}"  # 8 znaków hex jak dotąd, bez obiektu UUID
 
 def add_task(column_id: str, t: Task) -> str:
     b = get_board()
     tid = next_id("t")
     b.tasks[tid] = t
-    for c in b.columns:
-        if c.id == column_id:
-            c.task_ids.append(tid)
-            break
+    col = b.column(column_id)
+    if col: col.task_ids.append(tid)
     save_board(b); bump_rev(); return tid
 
 def edit_task(task_id: str, updates: dict):
@@ -297,17 +451,17 @@ def edit_task(task_id: str, updates: dict):
     if task_id not in b.tasks:
         st.error("Nie znaleziono zadania.")
         return
-    new = b.tasks[task_id].model_copy(update=updates)
-    b.tasks[task_id] = Task(**new.model_dump())
-    save_board(b)
+    if "due" in updates:
+        updates = {**updates, "due": Task.parse_due(updates["due"])}
+    b.tasks[task_id] = b.tasks[task_id].model_copy(update=updates)
+    save_board(b); bump_rev()
 
 def delete_task(task_id: str):
     b = get_board()
     b.tasks.pop(task_id, None)
-    for c in b.columns:
-        if task_id in c.task_ids:
-            c.task_ids.remove(task_id)
-    save_board(b)
+    col = b.column_of(task_id)
+    if col: col.task_ids.remove(task_id)
+    save_board(b); bump_rev()
 
 def add_column(name: str) -> str:
     b = get_board()
@@ -317,52 +471,40 @@ def add_column(name: str) -> str:
 
 def rename_column(column_id: str, new_name: str):
     b = get_board()
-    for c in b.columns:
-        if c.id == column_id:
-            c.name = new_name
-            break
+    col = b.column(column_id)
+    if col: col.name = new_name
     save_board(b); bump_rev()
 
-def delete_column(column_id: str, move_tasks_to: Optional[str] = None):
+def delete_column(column_id: str, move_tasks_to: Optional[str] = None) -> Optional[str]:
+    """Zwraca komunikat błędu (wołający pokazuje go przez _flash) albo None po usunięciu."""
     b = get_board()
-    idx = next((i for i, c in enumerate(b.columns) if c.id == column_id), None)
+    idx = b.col_index().get(column_id)
     if idx is None:
-        st.error("Kolumna nie istnieje.")
-        return
+        return "Kolumna nie istnieje."
     col = b.columns[idx]
     if col.task_ids and not move_tasks_to:
-        st.error("Kolumna nie jest pusta. Wybierz kolumnę docelową.")
-        return
-    if move_tasks_to:
-        for c in b.columns:
-            if c.id == move_tasks_to:
-                c.task_ids.extend(col.task_ids)
-                break
+        return "Kolumna nie jest pusta. Wybierz kolumnę docelową."
+    target = b.column(move_tasks_to) if move_tasks_to else None
+    if target: target.task_ids.extend(col.task_ids)
     del b.columns[idx]
     save_board(b); bump_rev()
+    return None
 
 # ───────────────────────── Etykieta + ukryte ID ───────────────────────── #
 def item_label_multiline(t: Task) -> str:
-    title = (t.title or "").strip()
-    desc  = (t.desc  or "").strip()
-    due   = t.due.isoformat() if t.due else ""
-    prio  = f"Priorytet: {t.priority}"
-    return "\n".join([title, desc, due, prio])
+    due = t.due.isoformat() if t.due else ""
+    return f"{(t.title or '').strip()}\n{(t.desc or '').strip()}\n{due}\nPriorytet: {t.priority}"
 
 _HIDDEN = "\u2063"
 def encode_item(label: str, tid: str) -> str: return f"{label}{_HIDDEN}{tid}"
-def decode_item_id(s: str) -> str:
-    if _HIDDEN in s: return s.rsplit(_HIDDEN, 1)[-1]
-    if "::" in s:    return s.split("::", 1)[0]
-    return s
 
 # ───────────────────────── Import / Export ───────────────────────── #
 def export_json_button(board: Board, pid: str):
-    data = board.model_dump(mode="json")
-    for _, t in data["tasks"].items():
-        if t.get("due") is None: t["due"] = ""
+    # zrzut liczony raz na wersję tablicy – download_button dostaje go przy każdym rerunie
+    data = _session_memo("_export_cache", (pid, st.session_state.get(BOARD_REV_KEY, 0)),
+                         lambda: board.model_dump_json(indent=2, context={"export": True}).encode())
     st.download_button("⬇️ Export JSON",
-                       json.dumps(data, ensure_ascii=False, indent=2),
+                       data,
                        file_name=f"{pid}_board.json",
                        mime="application/json",
                        use_container_width=True,
@@ -375,10 +517,14 @@ def import_json_uploader(pid: str):
                           key=f"import_{token}")
     if up is not None:
         try:
-            raw = json.loads(up.read().decode("utf-8")); board = Board(**raw)
-            save_board(board); bump_rev(); st.success("Zaimportowano tablicę."); st.rerun()
-        except Exception as e:
+            board = _BOARD_ADAPTER.validate_json(up.read())
+        except ValidationError as e:
             st.error(f"Błąd walidacji importu: {e}")
+            return
+        save_board(board); bump_rev()
+        # nowy klucz uploadera – inaczej ten sam plik byłby importowany przy każdym rerunie
+        st.session_state["_import_token"] = token_hex(4)
+        st.success("Zaimportowano tablicę."); st.rerun()
 
 # ───────────────────────── UI / Styl ───────────────────────── #
 st.set_page_config(page_title="Kanban – Projekty", page_icon="🗂️", layout="wide")
@@ -393,9 +539,93 @@ st.markdown("""
   .sortable-item::first-line { font-weight: 700; }
   .block-container { padding-top: .6rem; }
   .stButton>button { margin-bottom: 0 !important; }
+  .kpanel { margin: 12px auto 8px auto; max-width: 760px; padding: 16px 16px 2px 16px; border-radius: 12px;
+            background: rgba(28,28,30,.95); border: 1px solid rgba(255,255,255,.08);
+            box-shadow: 0 10px 30px rgba(0,0,0,.35); }
 </style>
 """, unsafe_allow_html=True)
 
+# zmiany z poprzedniego przebiegu (mutacja + st.rerun() nie dochodzi do końca skryptu)
+flush_board()
+
+# ───────────────────────── SIDEBAR: akcje (on_click) ───────────────────────── #
+# Callbacki wykonują się przed skryptem, więc rerun po kliknięciu od razu widzi nowy stan
+# (bez drugiego przebiegu przez st.rerun()). Komunikaty przechodzą przez _flash → _show_flash.
+def _flash(slot: str, kind: str, msg: str):
+    st.session_state[f"_flash_{slot}"] = (kind, msg)
+
+def _show_flash(slot: str):
+    hit = st.session_state.pop(f"_flash_{slot}", None)
+    if hit: getattr(st, hit[0])(hit[1])
+
+def _open_project(pid: str):
+    flush_board()
+    _set_project_id(pid)
+    st.session_state.pop("project_select", None)  # selectbox wróci do index=cur_pid
+    st.session_state.pop("board", None)
+    bump_rev()  # jak switch_project – inaczej komponent DnD oddałby karty (i wynik) starego projektu
+
+def _do_create_project():
+    name = (st.session_state.get("np_name") or "").strip()
+    if not name:
+        _flash("create_project", "error", "Podaj nazwę projektu.")
+    elif db_project_exists(name):
+        _flash("create_project", "error", "Projekt o takiej nazwie już istnieje.")
+    else:
+        db_save_board(name, default_board_dict())
+        _open_project(name)
+        _flash("create_project", "success", "Utworzono projekt.")
+
+def _do_rename_project():
+    new_name = (st.session_state.get("rn_new") or "").strip()
+    if not new_name:
+        _flash("rename_project", "error", "Podaj nową nazwę.")
+    elif db_project_exists(new_name):
+        _flash("rename_project", "error", "Projekt o takiej nazwie już istnieje.")
+    else:
+        flush_board()  # klon bierze stan z DB
+        old_name = current_project()
+        if db_clone_project(old_name, new_name):
+            _open_project(new_name)
+            _flash("rename_project", "success", "Zmieniono nazwę projektu.")
+        else:
+            _flash("rename_project", "error", f"Nie udało się odczytać projektu „{old_name}” – nazwa bez zmian.")
+
+def _do_delete_project():
+    pid = current_project()
+    projects_now = db_list_projects()
+    if len(projects_now) <= 1:
+        _flash("delete_project", "error", "Nie można usunąć jedynego projektu.")
+        return
+    next_pid = next((p for p in projects_now if p != pid), "main")
+    st.session_state.pop("_board_dirty", None)  # niezapisane zmiany usuwanego projektu
+    db_delete_project(pid)
+    _open_project(next_pid)
+    _flash("delete_project", "success", f"Usunięto projekt „{pid}”.")
+
+def _do_add_column():
+    name = (st.session_state.get("new_col_name") or "").strip()
+    if name:
+        add_column(name); _flash("add_column", "success", "Dodano kolumnę.")
+    else:
+        _flash("add_column", "error", "Podaj nazwę kolumny.")
+
+def _do_delete_column(col_by_name: dict[str, str]):
+    del_id = col_by_name.get(st.session_state.get("del_col_sel"))
+    tgt_name = st.session_state.get("move_tasks_to_sel")
+    move_to = col_by_name.get(tgt_name) if tgt_name != "—" else None
+    if not del_id: return
+    err = delete_column(del_id, move_to)
+    _flash("delete_column", *(("error", err) if err else ("success", "Usunięto kolumnę.")))
+
+def _do_rename_column(col_by_name: dict[str, str]):
+    new_name = (st.session_state.get("rename_col_val") or "").strip()
+    col_id = col_by_name.get(st.session_state.get("rename_col_sel"))
+    if not new_name:
+        _flash("rename_column", "error", "Podaj nową nazwę.")
+    elif col_id:
+        rename_column(col_id, new_name); _flash("rename_column", "success", "Zmieniono nazwę.")
+
 # ───────────────────────── SIDEBAR: Projekty ───────────────────────── #
 with st.sidebar:
     st.info(f"Build: {BUILD_TAG}")
@@ -419,58 +649,28 @@ with st.sidebar.expander("📁 Projekt – wybór", expanded=True):
         switch_project(sel)
 
 with st.sidebar.expander("Nowy projekt"):
-    np_name = st.text_input("Nazwa projektu", key="np_name")
-    if st.button("➕ Utwórz projekt", use_container_width=True, key="create_project_btn"):
-        name = (np_name or "").strip()
-        if not name:
-            st.error("Podaj nazwę projektu.")
-        elif db_project_exists(name):
-            st.error("Projekt o takiej nazwie już istnieje.")
-        else:
-            db_save_board(name, DEFAULT_BOARD.model_dump(mode="json"))
-            _set_project_id(name)
-            st.success("Utworzono projekt.")
-            st.session_state.pop("board", None)
-            st.rerun()
+    st.text_input("Nazwa projektu", key="np_name")
+    st.button("➕ Utwórz projekt", use_container_width=True, key="create_project_btn", on_click=_do_create_project)
+    _show_flash("create_project")
 
 with st.sidebar.expander("Zmień nazwę projektu"):
     rn_new = st.text_input("Nowa nazwa", key="rn_new")
-    if st.button("✏️ Zmień nazwę", use_container_width=True, key="rename_project_btn", disabled=not rn_new.strip()):
-        new_name = rn_new.strip()
-        old = current_project()
-        if not new_name:
-            st.error("Podaj nową nazwę.")
-        elif db_project_exists(new_name):
-            st.error("Projekt o takiej nazwie już istnieje.")
-        else:
-            ok = db_clone_project(old, new_name)
-            if ok:
-                _set_project_id(new_name)
-                st.success("Zmieniono nazwę projektu.")
-                st.session_state.pop("board", None)
-                st.rerun()
+    st.button("✏️ Zmień nazwę", use_container_width=True, key="rename_project_btn", disabled=not rn_new.strip(),
+              on_click=_do_rename_project)
+    _show_flash("rename_project")
 
 with st.sidebar.expander("Usuń projekt"):
     del_ok = st.checkbox("Tak, usuń ten projekt", key="confirm_delete_project")
-    if st.button("🗑️ Usuń projekt", use_container_width=True, key="delete_project_btn", disabled=not del_ok):
-        pid = current_project()
-        projects_now = db_list_projects()
-        if len(projects_now) <= 1:
-            st.error("Nie można usunąć jedynego projektu.")
-        else:
-            next_pid = next((p for p in projects_now if p != pid), "main")
-            db_delete_project(pid)
-            _set_project_id(next_pid)
-            st.success(f"Usunięto projekt „{pid}”.")
-            st.session_state.pop("board", None)
-            st.rerun()
+    st.button("🗑️ Usuń projekt", use_container_width=True, key="delete_project_btn", disabled=not del_ok,
+              on_click=_do_delete_project)
+    _show_flash("delete_project")
 
 # ───────────────────────── SIDEBAR: Status DB + narzędzia ───────────────────────── #
 with st.sidebar:
     pid = current_project()
     sb = _sb_client()
     if sb:
-        row, status = db_load_board_raw(pid)
+        row, status = db_load_board_raw(pid, with_data=False)
         table = _sb_table_name()
         if status == "ok":
             last = row.get("updated_at", "—")
@@ -478,19 +678,30 @@ with st.sidebar:
             st.caption(f"Projekt: {pid} | Tabela: {table} | Updated: {last}")
             if st.button("🔁 Force DB reload", use_container_width=True, key="force_db_reload_btn"):
                 st.session_state.pop("board", None)
-                st.rerun()
+                _sb_rows_invalidate()
+                bump_rev(); st.rerun()
         elif status == "not_found":
             st.warning(f"Persistencja: ON, ale brak rekordu dla projektu „{pid}”. Zapis pojawi się po pierwszej zmianie.")
     else:
         st.warning("Persistencja: tylko sesja (OFF) – dodaj SUPABASE_URL/KEY w Secrets.")
 
 # ───────────────────────── SIDEBAR: Filtry + Import/Export + Kolumny ───────────────────────── #
+def all_board_tags(board: Board) -> list[str]:
+    key = (current_project(), st.session_state.get(BOARD_REV_KEY, 0))
+    return _session_memo("_all_tags_cache", key,
+                         lambda: sorted({tag for task in board.tasks.values() for tag in task.tags}))
+
 b = get_board()
+col_by_name = {c.name: c.id for c in b.columns}  # jedna mapa dla sidebaru i obu modali
+col_names   = list(col_by_name.keys())
 st.sidebar.header("🔎 Filtry")
-title_filter = st.sidebar.text_input("Tytuł zawiera…", key="filter_title")
-prio_filter  = st.sidebar.multiselect("Priorytet", options=["Low", "Med", "High"], key="filter_prio")
-all_tags     = sorted({tag for task in b.tasks.values() for tag in task.tags})
-tags_filter  = st.sidebar.multiselect("Tagi", options=all_tags, key="filter_tags")
+all_tags = all_board_tags(b)
+# formularz: zmiany filtrów trafiają do skryptu dopiero po „Zastosuj” – jeden rerun zamiast jednego na każde pole
+with st.sidebar.form("filters_form"):
+    title_filter = st.text_input("Tytuł zawiera…", key="filter_title")
+    prio_filter  = st.multiselect("Priorytet", options=["Low", "Med", "High"], key="filter_prio")
+    tags_filter  = st.multiselect("Tagi", options=all_tags, key="filter_tags")
+    st.form_submit_button("Zastosuj", use_container_width=True)
 
 st.sidebar.divider(); st.sidebar.header("💾 Import / Export")
 export_json_button(b, current_project())
@@ -498,36 +709,28 @@ import_json_uploader(current_project())
 
 st.sidebar.divider(); st.sidebar.header("🧱 Kolumny")
 with st.sidebar.expander("Dodaj kolumnę"):
-    new_col_name = st.text_input("Nazwa nowej kolumny", key="new_col_name")
-    if st.button("➕ Dodaj kolumnę", use_container_width=True, key="add_column_btn"):
-        if new_col_name and new_col_name.strip():
-            add_column(new_col_name.strip()); st.success("Dodano kolumnę."); st.rerun()
-        else:
-            st.error("Podaj nazwę kolumny.")
+    st.text_input("Nazwa nowej kolumny", key="new_col_name")
+    st.button("➕ Dodaj kolumnę", use_container_width=True, key="add_column_btn", on_click=_do_add_column)
+    _show_flash("add_column")
 with st.sidebar.expander("Zmień nazwę kolumny"):
-    col_opts = {c.name: c.id for c in b.columns}
-    if col_opts:
-        sel_name = st.selectbox("Kolumna", options=list(col_opts.keys()), key="rename_col_sel")
-        new_name = st.text_input("Nowa nazwa", key="rename_col_val")
-        if st.button("✏️ Zmień nazwę", use_container_width=True, key="rename_column_btn"):
-            if new_name and new_name.strip():
-                rename_column(col_opts[sel_name], new_name.strip()); st.success("Zmieniono nazwę."); st.rerun()
-            else:
-                st.error("Podaj nową nazwę.")
+    if col_by_name:
+        st.selectbox("Kolumna", options=col_names, key="rename_col_sel")
+        st.text_input("Nowa nazwa", key="rename_col_val")
+        st.button("✏️ Zmień nazwę", use_container_width=True, key="rename_column_btn",
+                  on_click=_do_rename_column, args=(col_by_name,))
+    _show_flash("rename_column")
 with st.sidebar.expander("Usuń kolumnę"):
-    col_opts2 = {c.name: c.id for c in b.columns}
-    if col_opts2:
-        del_name = st.selectbox("Kolumna do usunięcia", options=list(col_opts2.keys()), key="del_col_sel")
-        others   = [(c.name, c.id) for c in b.columns if c.name != del_name]
-        tgt_name = st.selectbox("Przenieś zadania do…", options=["—"] + [n for n,_ in others], key="move_tasks_to_sel")
+    if col_by_name:
+        del_name = st.selectbox("Kolumna do usunięcia", options=col_names, key="del_col_sel")
+        others   = {n: i for n, i in col_by_name.items() if n != del_name}
+        st.selectbox("Przenieś zadania do…", options=["—"] + list(others), key="move_tasks_to_sel")
         confirm  = st.checkbox("Potwierdzam usunięcie", key="confirm_delete_column")
-        if st.button("🗑️ Usuń kolumnę", use_container_width=True, key="delete_column_btn", disabled=not confirm):
-            move_to = dict(others).get(tgt_name) if tgt_name != "—" else None
-            delete_column(col_opts2[del_name], move_to); st.rerun()
+        st.button("🗑️ Usuń kolumnę", use_container_width=True, key="delete_column_btn", disabled=not confirm,
+                  on_click=_do_delete_column, args=(col_by_name,))
+    _show_flash("delete_column")
 
 # ───────────────────────── Toolbar + przyciski (jeden modal na raz) ───────────────────────── #
-with elements("title"):
-    mui.Typography(f"📋 Tablica Kanban — projekt „{current_project()}” — {BUILD_TAG}", variant="h5", gutterBottom=True)
+st.subheader(f"📋 Tablica Kanban — projekt „{current_project()}” — {BUILD_TAG}")
 
 tb1, tb2 = st.columns([0.22, 0.22])
 open_add  = tb1.button("➕ Dodaj zadanie", use_container_width=True, key="open_add_btn")
@@ -542,10 +745,12 @@ if st.session_state.get("show_add_modal") and st.session_state.get("show_edit_mo
     st.session_state["show_add_modal"] = False  # preferuj „Edytuj”, jeśli oba True
 
 # ───────────────────────── Modal: Dodaj zadanie ───────────────────────── #
-if st.session_state.get("show_add_modal"):
+# Modale jako fragmenty: interakcje wewnątrz (wybór zadania, checkbox terminu) nie przeliczają
+# sidebaru ani tablicy; zapis/anulowanie kończy się st.rerun() całej aplikacji.
+@_fragment
+def add_task_modal(col_by_name: dict[str, str]):
+    col_names = list(col_by_name)
     with _modal("➕ Dodaj zadanie", key="add_modal"):
-        b = get_board()
-        col_map = {c.name: c.id for c in b.columns}
         with st.form("add_task_form_modal", clear_on_submit=True):
             c = st.columns(2)
             add_title = c[0].text_input("Tytuł*", placeholder="Nazwa zadania", key="add_title")
@@ -555,46 +760,45 @@ if st.session_state.get("show_add_modal"):
             add_due_enabled = c2[0].checkbox("Ustaw termin", key="add_due_en")
             add_due_val     = c2[0].date_input("Termin", value=date.today(), disabled=not add_due_enabled, key="add_due")
             add_tags_txt    = c2[1].text_input("Tagi (rozdziel przecinkami)", placeholder="ops, ui, backend", key="add_tags")
-            add_colname     = st.selectbox("Kolumna docelowa", options=list(col_map.keys()) if col_map else [], key="add_col_sel")
+            add_colname     = st.selectbox("Kolumna docelowa", options=col_names, key="add_col_sel")
             submitted       = st.form_submit_button("Dodaj", use_container_width=True)
         if submitted:
             if not add_title or not add_title.strip():
                 st.error("Tytuł jest wymagany.")
-            elif not col_map:
+            elif not col_by_name:
                 st.error("Brak kolumn.")
             else:
                 tags = [t.strip() for t in add_tags_txt.split(",") if t.strip()]
                 due  = add_due_val if add_due_enabled else None
                 task = Task(title=add_title.strip(), desc=(add_desc or "").strip(),
                             priority=add_prio, due=due, tags=tags)
-                add_task(col_map[add_colname], task)
+                add_task(col_by_name[add_colname], task)
                 st.session_state["show_add_modal"] = False
                 st.success("Dodano zadanie."); st.rerun()
         if st.button("Anuluj", type="secondary", key="cancel_add_btn"):
             st.session_state["show_add_modal"] = False; st.rerun()
 
+if st.session_state.get("show_add_modal"):
+    add_task_modal(col_by_name)
+
 # ───────────────────────── Modal: Edytuj zadanie ───────────────────────── #
-if st.session_state.get("show_edit_modal"):
+@_fragment
+def edit_task_modal(col_by_name: dict[str, str]):
+    col_names = list(col_by_name)
     with _modal("✏️ Edytuj zadanie", key="edit_modal"):
         b = get_board()
-        task_choices = []
-        for c in b.columns:
-            for tid in c.task_ids:
-                t = b.tasks.get(tid)
-                if t: task_choices.append((f"{c.name}: {t.title}", tid))
-        if not task_choices:
+        task_map = {f"{c.name}: {b.tasks[tid].title}": tid
+                    for c in b.columns for tid in c.task_ids if tid in b.tasks}
+        if not task_map:
             st.info("Brak zadań do edycji.")
             if st.button("Zamknij", key="close_edit_no_tasks_btn"):
                 st.session_state["show_edit_modal"] = False; st.rerun()
         else:
-            labels = [lbl for lbl,_ in task_choices]
-            selected_label = st.selectbox("Wybierz zadanie", options=labels, key="edit_modal_select")
-            selected_tid   = dict(task_choices)[selected_label]
+            selected_label = st.selectbox("Wybierz zadanie", options=list(task_map), key="edit_modal_select")
+            selected_tid   = task_map[selected_label]
             t = b.tasks[selected_tid]
-            current_col_id = next((c.id for c in b.columns if selected_tid in c.task_ids), b.columns[0].id)
-            col_map2  = {c.name: c.id for c in b.columns}
-            col_names = list(col_map2.keys())
-            current_col_name = next(n for n,i in col_map2.items() if i == current_col_id)
+            current_col_id = (b.column_of(selected_tid) or b.columns[0]).id
+            current_col_name = b.column(current_col_id).name
 
             with st.form("edit_task_form_modal", clear_on_submit=True):
                 c = st.columns(2)
@@ -624,14 +828,12 @@ if st.session_state.get("show_edit_modal"):
                         "tags": [x.strip() for x in etags.split(",") if x.strip()],
                     }
                     edit_task(selected_tid, updates)
-                    new_col_id = col_map2[ecolname]
+                    new_col_id = col_by_name[ecolname]
                     if new_col_id != current_col_id:
-                        b2 = get_board()
-                        for c in b2.columns:
-                            if selected_tid in c.task_ids: c.task_ids.remove(selected_tid)
-                        for c in b2.columns:
-                            if c.id == new_col_id: c.task_ids.append(selected_tid)
-                        save_board(b2)
+                        # edit_task pracuje na tym samym obiekcie co b – bez ponownego get_board()
+                        b.column(current_col_id).task_ids.remove(selected_tid)
+                        b.column(new_col_id).task_ids.append(selected_tid)
+                        save_board(b)
                     st.session_state["show_edit_modal"] = False
                     st.success("Zapisano zadanie."); st.rerun()
             if del_click:
@@ -642,26 +844,65 @@ if st.session_state.get("show_edit_modal"):
             if cancel_btn:
                 st.session_state["show_edit_modal"] = False; st.rerun()
 
-# ───────────────────────── Tablica (DnD) ───────────────────────── #
-def pass_filter(t: Task) -> bool:
-    ok_title = title_filter.lower() in t.title.lower() if title_filter else True
-    ok_prio  = (t.priority in prio_filter) if prio_filter else True
-    ok_tags  = (not tags_filter) or (set(tags_filter) & set(t.tags))
-    return ok_title and ok_prio and ok_tags
+if st.session_state.get("show_edit_modal"):
+    edit_task_modal(col_by_name)
 
-b = get_board()
-containers = []
-for col in b.columns:
-    items = []
-    for tid in col.task_ids:
-        t = b.tasks.get(tid)
-        if not t: continue
-        label = item_label_multiline(t) if pass_filter(t) else f"(ukryte filtrem)\n\n\nPriorytet: {t.priority}"
-        items.append(encode_item(label, tid))
-    containers.append({"header": f"{col.name}", "items": items})
-
-rev = st.session_state.get(REV_KEY, 0)
-result = sort_items(containers, multi_containers=True, direction="vertical", key=f"react-kanban-{rev}")
+# ───────────────────────── Tablica (DnD) ───────────────────────── #
+def filter_signature(title_filter: str, prio_filter: list[str], tags_filter: list[str]) -> tuple:
+    """Filtry znormalizowane raz na rerun: (tytuł małymi literami, frozenset priorytetów, frozenset tagów)."""
+    return ((title_filter or "").lower(), frozenset(prio_filter), frozenset(tags_filter))
+
+def pass_filter(t: Task, filter_sig: tuple) -> bool:
+    title_q, prios, tags = filter_sig
+    if prios and t.priority not in prios: return False
+    if tags and tags.isdisjoint(t.tags):  return False
+    return not title_q or title_q in t.title.lower()
+
+def dnd_limit(column_id: str) -> Optional[int]:
+    return None if st.session_state.get(f"_show_more_{column_id}") else DND_PAGE
+
+def dnd_tail(col: ColumnModel) -> list[str]:
+    """Zadania kolumny spoza okna DnD – nie trafiają do sort_items, więc dokleja się je przy zapisie."""
+    limit = dnd_limit(col.id)
+    return col.task_ids[limit:] if limit is not None else []
+
+# etykiety kart ukrytych filtrem – zależą tylko od priorytetu, więc gotowe raz na proces
+_HIDDEN_LABELS = {p: f"(ukryte filtrem)\n\n\nPriorytet: {p}" for p in ("Low", "Med", "High")}
+
+def build_containers(board: Board, filter_sig: tuple) -> tuple[list[dict], dict[str, str], list[set[str]]]:
+    """Zwraca (containers dla sort_items, mapa element → tid do odczytu wyniku DnD, id wysłane per kolumna)."""
+    def build():
+        containers, item_tids, sent_ids = [], {}, []
+        # gotowe elementy per zadanie: edit_task/import podmieniają obiekt Task, więc tożsamość = wersja
+        old_items, encoded = st.session_state.get("_item_cache", {}), {}
+        active = any(filter_sig)  # bez filtrów (częsty przypadek) pass_filter nie jest wołany
+        tasks_get = board.tasks.get
+        for col in board.columns:
+            items = []
+            for tid in col.task_ids[:dnd_limit(col.id)]:
+                t = tasks_get(tid)
+                if not t: continue
+                hit = old_items.get(tid)
+                if hit is None or hit[0] is not t:
+                    hit = (t, encode_item(item_label_multiline(t), tid))
+                encoded[tid] = hit
+                if not active or pass_filter(t, filter_sig):
+                    item = hit[1]
+                else:
+                    label = _HIDDEN_LABELS.get(t.priority) or f"(ukryte filtrem)\n\n\nPriorytet: {t.priority}"
+                    item = encode_item(label, tid)
+                item_tids[item] = tid
+                items.append(item)
+            hidden = len(dnd_tail(col))
+            containers.append({"header": f"{col.name} (+{hidden} niewidocznych)" if hidden else f"{col.name}",
+                               "items": items})
+            sent_ids.append({item_tids[item] for item in items})
+        st.session_state["_item_cache"] = encoded
+        return containers, item_tids, sent_ids
+    # session_state, nie st.cache_data – cache_data jest wspólny dla wszystkich sesji
+    key = (current_project(), st.session_state.get(BOARD_REV_KEY, 0), filter_sig,
+           tuple(dnd_limit(c.id) for c in board.columns))
+    return _session_memo("_containers_cache", key, build)
 
 def _extract_items(container_result):
     if container_result is None: return []
@@ -671,12 +912,59 @@ def _extract_items(container_result):
         if isinstance(container_result, dict) and k in container_result: return container_result[k]
     return []
 
-if result is not None:
-    normalized = [_extract_items(c) for c in result]
-    changed = False; b2 = get_board()
-    for i, col in enumerate(b2.columns):
-        new_ids = [decode_item_id(s) for s in (normalized[i] if i < len(normalized) else [])]
-        if new_ids != col.task_ids: col.task_ids = new_ids; changed = True
-    if changed: save_board(b2)
+@_fragment
+def render_board(filter_sig: tuple):
+    """Tablica jako fragment: przebiegi bez zmiany tablicy (odrzucony/pusty wynik DnD) nie przeliczają sidebaru."""
+    b = get_board()
+    containers, item_tids, sent_ids = build_containers(b, filter_sig)
+
+    # sort_items trzyma karty we własnym stanie Reacta (useState(props.items)) i nie czyta nowych
+    # propsów – zmiana kart (dodanie/edycja/usunięcie/filtr) wymaga nowego klucza. Przeciągnięcie
+    # klucza nie zmienia: komponent już pokazuje nowy układ, więc remount byłby zbędny.
+    if st.session_state.get("_dnd_filter_sig") != filter_sig:
+        st.session_state["_dnd_filter_sig"] = filter_sig; bump_rev()
+    rev = st.session_state.get(REV_KEY, 0)
+    result = sort_items(containers, multi_containers=True, direction="vertical", key=f"react-kanban-{rev}")
+
+    if result is not None and result is not containers:  # wartość domyślna komponentu = nasze containers
+        # jeden przebieg: kolumna oddana bez zmian → None, bez dekodowania; got = wszystkie oddane id
+        returned, got = [], []
+        for i, sent in enumerate(containers):
+            items = _extract_items(result[i]) if i < len(result) else []
+            if items == sent["items"]:
+                returned.append(None); got.extend(sent_ids[i]); continue
+            ids = [item_tids.get(s) for s in items]
+            returned.append(ids); got.extend(ids)
+        # wynik z wcześniejszego renderu (inny projekt, usunięte/edytowane karty) nie jest permutacją
+        # wysłanych kart – nie przepisujemy z niego kolumn, tylko odświeżamy komponent
+        sent_all = set().union(*sent_ids)
+        if len(result) != len(containers) or len(got) != len(sent_all) or set(got) != sent_all:
+            bump_rev(); st.rerun()
+        changed = remount = False
+        for col, new_ids, sent in zip(b.columns, returned, sent_ids):
+            if new_ids is None: continue
+            # ogon = to, czego komponent nie dostał (nie liczony od nowa z task_ids – okno mogło się przesunąć)
+            hidden = len(dnd_tail(col))
+            task_ids = new_ids + [tid for tid in col.task_ids if tid not in sent]
+            if task_ids == col.task_ids: continue
+            col.task_ids = task_ids; changed = True
+            # okno albo „(+N niewidocznych)” się przesunęło – komponent bez nowego klucza by tego nie pokazał
+            remount |= task_ids[:dnd_limit(col.id)] != new_ids or len(dnd_tail(col)) != hidden
+        if remount: bump_rev()
+        if changed:
+            # pełny rerun: eksport i „Updated:” w sidebarze są poza fragmentem i pokazywałyby stan sprzed zmiany
+            save_board(b); st.rerun()
+
+    for col in b.columns:
+        hidden = len(dnd_tail(col))
+        if hidden and st.button(f"⬇️ Pokaż wszystkie w „{col.name}” (+{hidden})", key=f"show_more_btn_{col.id}"):
+            st.session_state[f"_show_more_{col.id}"] = True
+            bump_rev(); st.rerun()  # nowy klucz komponentu – stary wynik DnD nie zna reszty kart
+
+    flush_board()  # przebieg samego fragmentu nie dochodzi do końca skryptu
+
+render_board(filter_signature(title_filter, prio_filter, tags_filter))
 
 st.caption("Projekty w sidebarze (z wyszukiwarką). Panel–modal inline (bez overlay). Import/Export per projekt. Supabase — jeśli skonfigurowano.")
+
+flush_board()